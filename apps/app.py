@@ -1,3 +1,4 @@
+from apps.cache import Cache
 from apps.config import config
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
@@ -7,6 +8,9 @@ from flask import Flask, redirect, url_for, session
 
 db = SQLAlchemy()
 
+# 워커 프로세스 간 공유 캐시 (답변 / 임베딩 / 사용자 조회)
+cache = Cache()
+
 
 login_manager = LoginManager()
 login_manager.login_view = "program_chat.index"
@@ -24,6 +28,7 @@ def create_app(config_key='dev'):
     login_manager.init_app(app)
     app.config['SESSION_PERMANENT'] = False
     db.init_app(app)
+    cache.init_app(app)
     Migrate(app,db)
     
     from apps import models
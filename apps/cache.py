@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from langchain_core.embeddings import Embeddings
+
+# 만료 시간을 지정하지 않았을 때 사용하는 기본값(초) - 영구 보관 항목은 만들지 않음
+DEFAULT_TIMEOUT = 60 * 60 * 24
+
+
+def make_key(namespace, *parts):
+    """네임스페이스 + 내용 해시로 캐시 키 생성"""
+    digest = hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+    return f"{namespace}:{digest}"
+
+
+class MemoryCache:
+    """프로세스 내부 딕셔너리 캐시 (워커 1개일 때 / 개발용)"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.time():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, timeout):
+        expires = time.time() + timeout
+        with self._lock:
+            self._data.pop(key, None)
+            if len(self._data) >= self.max_entries:
+                self._sweep()
+            self._data[key] = (value, expires)
+
+    def _sweep(self):
+        """만료 항목을 지우고, 그래도 가득 차 있으면 오래된 항목부터 제거"""
+        now = time.time()
+        for key in [k for k, (_, expires) in self._data.items() if expires < now]:
+            del self._data[key]
+        while len(self._data) >= self.max_entries:
+            del self._data[next(iter(self._data))]
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class FileCache:
+    """SQLite 파일 기반 캐시 - 같은 서버의 모든 워커 프로세스가 공유"""
+
+    def __init__(self, path, purge_interval=200):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 쓰기 purge_interval 번마다 만료 항목을 일괄 삭제 (키가 다시 읽히지 않아도 파일이 커지지 않도록)
+        self.purge_interval = purge_interval
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        self._local = threading.local()
+        # 초기화용 커넥션은 바로 닫음 (pre-fork 시 부모의 SQLite 커넥션이 워커로 넘어가지 않도록)
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            conn.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+        finally:
+            conn.close()
+
+    def _connect(self):
+        # fork 이후에는 부모의 커넥션을 쓰지 않고 프로세스/스레드별로 새로 연다
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value, expires FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if expires < time.time():
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            return None
+        return json.loads(value)
+
+    def set(self, key, value, timeout):
+        expires = time.time() + timeout
+        self._connect().execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), expires),
+        )
+        with self._writes_lock:
+            self._writes += 1
+            should_purge = self._writes % self.purge_interval == 0
+        if should_purge:
+            self.purge()
+
+    def purge(self):
+        """만료된 항목 일괄 삭제"""
+        self._connect().execute(
+            "DELETE FROM cache WHERE expires < ?", (time.time(),)
+        )
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def close(self):
+        """현재 스레드의 커넥션을 닫음 - fork 전에 호출"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
+
+
+class RedisCache:
+    """Redis 캐시 - 여러 서버에 걸쳐 캐시를 공유할 때 사용"""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(
+                "CACHE_BACKEND=redis 를 사용하려면 redis 패키지를 설치하세요."
+            ) from e
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self._client.get(key)
+        return None if value is None else json.loads(value)
+
+    def set(self, key, value, timeout):
+        self._client.set(key, json.dumps(value, ensure_ascii=False), ex=timeout)
+
+    def delete(self, key):
+        self._client.delete(key)
+
+    def close(self):
+        self._client.close()
+
+
+class Cache:
+    """앱 설정(CACHE_BACKEND)에 따라 백엔드를 고르는 캐시 래퍼"""
+
+    def __init__(self):
+        self._backend = None
+        self.default_timeout = DEFAULT_TIMEOUT
+
+    def init_app(self, app):
+        backend = app.config.get("CACHE_BACKEND", "file")
+        if backend == "memory":
+            self._backend = MemoryCache(app.config.get("CACHE_MAX_ENTRIES", 10000))
+        elif backend == "file":
+            self._backend = FileCache(app.config["CACHE_PATH"])
+        elif backend == "redis":
+            self._backend = RedisCache(app.config["CACHE_REDIS_URL"])
+        else:
+            raise ValueError(f"알 수 없는 CACHE_BACKEND 입니다: {backend}")
+        # 0 이하(무기한)는 허용하지 않고 기본 만료 시간으로 대체
+        self.default_timeout = app.config.get("CACHE_DEFAULT_TIMEOUT") or DEFAULT_TIMEOUT
+        if self.default_timeout <= 0:
+            self.default_timeout = DEFAULT_TIMEOUT
+
+    def get(self, key):
+        if self._backend is None:
+            return None
+        try:
+            return self._backend.get(key)
+        except Exception:
+            # 캐시 장애로 요청이 실패하지 않도록 miss 로 처리
+            return None
+
+    def set(self, key, value, timeout=None):
+        if self._backend is None:
+            return
+        try:
+            if timeout is None or timeout <= 0:
+                timeout = self.default_timeout
+            self._backend.set(key, value, timeout)
+        except Exception:
+            pass
+
+    def delete(self, key):
+        if self._backend is None:
+            return
+        try:
+            self._backend.delete(key)
+        except Exception:
+            pass
+
+    def close(self):
+        """백엔드 커넥션 정리 (pre-fork 전에 부모 프로세스에서 호출)"""
+        close = getattr(self._backend, "close", None)
+        if close is not None:
+            close()
+
+
+class CachedEmbeddings(Embeddings):
+    """임베딩 결과를 공유 캐시에 저장해 같은 문장을 다시 임베딩하지 않도록 함"""
+
+    def __init__(self, embeddings, cache, namespace):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.namespace = namespace
+
+    def embed_documents(self, texts):
+        keys = [make_key(self.namespace, text) for text in texts]
+        vectors = [self.cache.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            computed = self.embeddings.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+                self.cache.set(keys[i], vector)
+        return vectors
+
+    def embed_query(self, text):
+        key = make_key(self.namespace, text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.set(key, vector)
+        return vector
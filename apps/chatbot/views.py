@@ -3,14 +3,17 @@ import re
 import time
 from datetime import datetime
 
-from flask import (Blueprint, Response, current_app, flash, jsonify,
+from flask import (Blueprint, Response, abort, current_app, flash, jsonify,
                    redirect, render_template, request, session, url_for, stream_with_context)
 from flask_login import (current_user, login_required, login_user,
                          logout_user)
 from langchain.schema import AIMessage, HumanMessage
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_openai import ChatOpenAI
+from sqlalchemy import func
 
-from apps.app import db
+from apps.app import cache, db
+from apps.cache import CachedEmbeddings, make_key
 from apps.chatbot.forms import LoginForm
 from apps.models import ChatLog, User, UserSession
 
@@ -31,13 +34,17 @@ program_chat = Blueprint(
 # --- ❗ 실시간 스트리밍을 위해 llm 설정 변경 ---
 llm = ChatOpenAI(
     streaming=True, # 스트리밍 활성화
+    stream_usage=True, # 스트림 마지막 청크로 정확한 토큰 사용량 수신
     model_name=os.getenv("OPENAI_API_MODEL", "gpt-4-turbo"),
     temperature=float(os.getenv("OPENAI_API_TEMPERATURE", 0.7)),
 )
 
-# 1. 임베딩 모델 준비 (동일)
-embeddings = OpenAIEmbeddings(
-    model=os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-large")
+# 1. 임베딩 모델 준비 (워커 간 공유 캐시를 거쳐 같은 질문은 다시 임베딩하지 않음)
+EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-large")
+embeddings = CachedEmbeddings(
+    OpenAIEmbeddings(model=EMBEDDING_MODEL),
+    cache,
+    namespace=f"embedding:{EMBEDDING_MODEL}",
 )
 
 
@@ -93,6 +100,89 @@ conv_qa = ConversationalRetrievalChain.from_llm(
     combine_docs_chain_kwargs={"prompt": QA_PROMPT}
 )
 
+# 취소 플래그(공유 캐시) 확인 주기(초) - 토큰마다 캐시를 조회하지 않도록 제한
+CANCEL_POLL_INTERVAL = 0.5
+
+
+class GenerationCancelled(Exception):
+    """학생이 이탈해 답변 생성을 중단할 때 발생"""
+
+
+class CancellationHandler(BaseCallbackHandler):
+    """LLM 토큰마다 취소 여부를 확인하고, 취소 시 예외로 OpenAI 스트림을 끊음"""
+
+    raise_error = True  # 핸들러 예외를 삼키지 않고 체인 밖으로 전달
+
+    def __init__(self, is_cancelled, answer_run_index=0):
+        self.is_cancelled = is_cancelled
+        # 대화 맥락이 있으면 질문 재작성 LLM 호출이 먼저 일어나므로 답변은 두 번째 호출
+        self.answer_run_index = answer_run_index
+        self.run_count = 0
+        self.answer_tokens = []
+        self.usage_tokens = None
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.run_count += 1
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.run_count += 1
+
+    def _in_answer_run(self):
+        return self.run_count - 1 == self.answer_run_index
+
+    def on_llm_new_token(self, token, **kwargs):
+        # 역할/종료 청크처럼 빈 토큰은 세지 않음
+        if token and self._in_answer_run():
+            self.answer_tokens.append(token)
+        if self.is_cancelled():
+            raise GenerationCancelled()
+
+    def on_llm_end(self, response, **kwargs):
+        if not self._in_answer_run():
+            return
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if usage:
+                    self.usage_tokens = usage["output_tokens"]
+
+    @property
+    def completion_tokens(self):
+        """답변 LLM 호출의 출력 토큰 수 (사용량 정보가 없으면 스트리밍된 토큰 수)"""
+        if self.usage_tokens is not None:
+            return self.usage_tokens
+        return len(self.answer_tokens)
+
+
+def cancel_key(user_id, page_id):
+    """페이지(탭) 단위 취소 플래그 키 - 다른 탭의 새로고침이 이 탭의 답변을 끊지 않도록 함"""
+    if not page_id or len(page_id) > 64:
+        return None
+    return f"cancel:{user_id}:{page_id}"
+
+
+def make_cancel_check(environ, user_id, page_id):
+    """클라이언트 연결 끊김 또는 /track-logout 취소 플래그를 확인하는 함수 생성"""
+    # waitress 의 channel_request_lookahead 설정 시에만 environ 에 제공됨
+    client_disconnected = environ.get("waitress.client_disconnected")
+    key = cancel_key(user_id, page_id)
+    last_poll = 0.0
+
+    def is_cancelled():
+        nonlocal last_poll
+        if client_disconnected is not None and client_disconnected():
+            return True
+        now = time.monotonic()
+        if key is None or now - last_poll < CANCEL_POLL_INTERVAL:
+            return False
+        last_poll = now
+        # 로그아웃 비콘은 다른 워커 프로세스로 갈 수 있으므로 공유 캐시로 전달받음
+        return cache.get(key) is not None
+
+    return is_cancelled
+
+
 @program_chat.route("/", methods=["GET", "POST"])
 def index():
     """로그인 처리"""
@@ -138,7 +228,10 @@ def logout():
 @program_chat.route("/track-logout", methods=["POST"])
 @login_required
 def track_logout():
-    """브라우저 종료 시 로그아웃 시간 기록"""
+    """브라우저 종료 시 로그아웃 시간 기록 및 해당 페이지의 진행 중인 답변 생성 취소"""
+    key = cancel_key(current_user.id, request.form.get("page_id"))
+    if key:
+        cache.set(key, time.time(), timeout=600)
     session_id = session.get('user_session_id')
     if session_id:
         user_session = UserSession.query.get(session_id)
@@ -154,6 +247,7 @@ def process_chat():
     data = request.get_json()
     user_message = data.get("message")
     history_data = data.get("history", [])
+    page_id = data.get("page_id")
 
     if not user_message:
         return jsonify({"error": "메시지가 없습니다."}), 400
@@ -179,18 +273,64 @@ def process_chat():
 
     chat_pairs = to_chat_pairs(history_data)
 
+    # 대화 맥락이 없는 첫 질문만 답변 캐시 대상 (맥락에 따라 답이 달라지므로)
+    answer_key = None
+    if not chat_pairs:
+        normalized = " ".join(user_message.split())
+        answer_key = make_key("answer", llm.model_name, normalized)
+
+    user_id = current_user.id
+    is_cancelled = make_cancel_check(request.environ, user_id, page_id)
+
+    def save_chat_log(response, status, completion_tokens=None, tokens_saved=0):
+        """답변을 텍스트/코드로 나눠 상태와 함께 DB에 저장"""
+        code_blocks = re.findall(r'```[\s\S]*?```', response)
+        text_blocks = re.sub(r'```[\s\S]*?```', '', response).strip()
+        extracted_code = "".join(code_blocks) if code_blocks else None
+
+        chat_log = ChatLog(
+            user_query=user_message,
+            assistant_response=text_blocks,
+            code=extracted_code,
+            status=status,
+            completion_tokens=completion_tokens,
+            tokens_saved=tokens_saved,
+            user_id=user_id
+        )
+        db.session.add(chat_log)
+        db.session.commit()
+
+    def estimate_tokens_saved(generated):
+        """완료된 답변의 평균 토큰 수 대비 중단으로 생성하지 않은 토큰 수 추정"""
+        average = db.session.query(func.avg(ChatLog.completion_tokens)).filter(
+            ChatLog.status == "completed",
+            ChatLog.completion_tokens.isnot(None)
+        ).scalar()
+        return max(int(average or 0) - generated, 0)
+
     @stream_with_context
     def generate_response_stream():
         yield "잠시만 기다려주세요..."
         
-        full_response = ""
         CLEAR_SIGNAL = "<!--CLEAR-->"
+        full_response = ""
+        completion_tokens = None
+        handler = CancellationHandler(is_cancelled, answer_run_index=1 if chat_pairs else 0)
 
         try:
-            # 1단계: LLM으로부터 전체 답변을 스트리밍으로 받아와 full_response에 저장
-            for chunk in conv_qa.stream({"question": user_message, "chat_history": chat_pairs}):
-                if "answer" in chunk:
-                    full_response += chunk["answer"]
+            # 1단계: 캐시된 답변이 없으면 LLM으로부터 전체 답변을 스트리밍으로 받아와 full_response에 저장
+            cached_response = cache.get(answer_key) if answer_key else None
+            if cached_response is not None:
+                full_response = cached_response
+            else:
+                for chunk in conv_qa.stream({"question": user_message, "chat_history": chat_pairs},
+                                            config={"callbacks": [handler]}):
+                    if "answer" in chunk:
+                        full_response += chunk["answer"]
+                completion_tokens = handler.completion_tokens
+                if answer_key and full_response:
+                    cache.set(answer_key, full_response,
+                              timeout=current_app.config["CACHE_ANSWER_TIMEOUT"])
 
             # 2단계: "기다려주세요" 메시지를 지우라는 신호를 먼저 보냄
             yield CLEAR_SIGNAL
@@ -208,22 +348,34 @@ def process_chat():
                 # 텍스트이면 타이핑 효과를 위해 한 글자씩 전송
                 else:
                     for char in part:
+                        if is_cancelled():
+                            save_chat_log(full_response, "partial", completion_tokens)
+                            return
                         yield char
                         time.sleep(0.02)
 
             # 5단계: 전체 답변을 DB에 저장
-            code_blocks = re.findall(r'```[\s\S]*?```', full_response)
-            text_blocks = re.sub(r'```[\s\S]*?```', '', full_response).strip()
-            extracted_code = "".join(code_blocks) if code_blocks else None
-            
-            chat_log = ChatLog(
-                user_query=user_message,
-                assistant_response= text_blocks ,
-                code=extracted_code,
-                user_id=current_user.id
-            )
-            db.session.add(chat_log)
-            db.session.commit()
+            save_chat_log(full_response, "completed", completion_tokens)
+
+        except GenerationCancelled:
+            # 생성 도중 이탈: OpenAI 스트림은 이미 끊겼으므로 생성된 부분까지만 기록
+            try:
+                generated = handler.completion_tokens
+                save_chat_log("".join(handler.answer_tokens), "cancelled", generated,
+                              estimate_tokens_saved(generated))
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.error(f"Error logging cancelled generation: {e}")
+            current_app.logger.info(f"Generation cancelled for user {user_id} after {handler.completion_tokens} answer tokens")
+
+        except GeneratorExit:
+            # 답변 전송 중 연결이 끊김 (waitress 가 응답 이터레이터를 닫음)
+            try:
+                save_chat_log(full_response, "partial", completion_tokens)
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.error(f"Error logging partial response: {e}")
+            raise
 
         except Exception as e:
             db.session.rollback()
@@ -233,3 +385,27 @@ def process_chat():
 
     return Response(generate_response_stream(), mimetype='text/plain')
 
+
+@program_chat.route("/stats/generations")
+@login_required
+def generation_stats():
+    """답변 상태별 건수와 중단으로 절약한 토큰 수"""
+    # 반 전체 통계이므로 STATS_USER_IDS 에 등록된 운영자만 조회 가능
+    if current_user.id not in current_app.config.get("STATS_USER_IDS", []):
+        abort(403)
+
+    rows = db.session.query(
+        ChatLog.status,
+        func.count(ChatLog.id),
+        func.coalesce(func.sum(ChatLog.completion_tokens), 0),
+        func.coalesce(func.sum(ChatLog.tokens_saved), 0)
+    ).group_by(ChatLog.status).all()
+
+    stats = {"completed": 0, "partial": 0, "cancelled": 0,
+             "tokens_generated": 0, "tokens_saved": 0}
+    for status, count, tokens_generated, tokens_saved in rows:
+        stats[status] = count
+        stats["tokens_generated"] += int(tokens_generated)
+        stats["tokens_saved"] += int(tokens_saved)
+    return jsonify(stats)
+
@@ -9,6 +9,20 @@ load_dotenv(basedir / '.env')
 class BaseConfig:
     SECRET_KEY = os.getenv("SECRET_KEY", "sodalabsecretss")
     COMMON_PASSWORD = os.getenv("COMMON_PASSWORD")
+    # 답변 통계(/program_chat/stats/generations)를 볼 수 있는 운영자 학번 (쉼표로 구분)
+    STATS_USER_IDS = [u.strip() for u in os.getenv("STATS_USER_IDS", "").split(",") if u.strip()]
+
+    # 워커 프로세스 간 공유 캐시 (memory / file / redis)
+    # file 백엔드는 SQLite 파일 하나를 모든 워커가 공유 (리눅스에서는 /dev/shm 경로 지정 시 메모리에 저장)
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "file")
+    CACHE_PATH = os.getenv("CACHE_PATH", str(basedir / "instance" / "cache.sqlite3"))
+    CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    CACHE_DEFAULT_TIMEOUT = int(os.getenv("CACHE_DEFAULT_TIMEOUT", 60 * 60 * 24))
+    CACHE_ANSWER_TIMEOUT = int(os.getenv("CACHE_ANSWER_TIMEOUT", 60 * 60))
+    # 사용자 조회 캐시 - 외부에서 users 를 정리해도 이 시간 안에 반영
+    CACHE_USER_TIMEOUT = int(os.getenv("CACHE_USER_TIMEOUT", 5 * 60))
+    # memory 백엔드의 프로세스당 최대 항목 수
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 10000))
 
 
 class DevConfig(BaseConfig):
@@ -1,6 +1,9 @@
 from datetime import datetime
-from apps.app import db, login_manager
+from apps.app import cache, db, login_manager
+from flask import current_app
 from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
 
 class User(db.Model, UserMixin):
 
@@ -12,10 +15,33 @@ class User(db.Model, UserMixin):
     def get_id(self):
         return str(self.id)
 
+
+def user_cache_key(user_id):
+    return f"user:{user_id}"
+
+
+@event.listens_for(User, "after_delete")
+def _forget_deleted_user(mapper, connection, target):
+    # 삭제된 사용자가 캐시로 계속 로그인 상태가 되지 않도록 즉시 제거
+    cache.delete(user_cache_key(target.id))
+
 @login_manager.user_loader
 def load_user(user_id):
+    # 매 요청마다 users 테이블을 조회하지 않도록 공유 캐시에 가입 정보를 저장
+    # (ORM 밖에서 삭제된 경우도 CACHE_USER_TIMEOUT 안에 DB 조회로 돌아가도록 짧게 유지)
+    key = user_cache_key(user_id)
+    cached = cache.get(key)
+    if cached is not None:
+        created_at = datetime.fromisoformat(cached) if cached else None
+        user = User(id=user_id, created_at=created_at)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
 
-    return User.query.get(user_id)
+    user = User.query.get(user_id)
+    if user is not None:
+        cache.set(key, user.created_at.isoformat() if user.created_at else "",
+                  timeout=current_app.config["CACHE_USER_TIMEOUT"])
+    return user
 
 class ChatLog(db.Model):
 
@@ -25,6 +51,10 @@ class ChatLog(db.Model):
     user_query = db.Column(db.Text, nullable=False)
     assistant_response = db.Column(db.Text, nullable=False)
     code = db.Column(db.Text, nullable=True)
+    # completed: 정상 전송 / partial: 생성 완료 후 전송 중 이탈 / cancelled: 생성 도중 중단
+    status = db.Column(db.String(16), nullable=False, default="completed", server_default="completed")
+    completion_tokens = db.Column(db.Integer, nullable=True)
+    tokens_saved = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
  
     user_id = db.Column(db.String, db.ForeignKey('users.id'), nullable=False)
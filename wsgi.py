@@ -1,13 +1,187 @@
+import argparse
 import os
-from apps.app import create_app
-from waitress import serve
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from apps.app import cache, create_app, db
+from waitress import create_server, serve
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
 config_key = os.getenv("dev")
-app = create_app(config_key)# waitress 서버로 애플리케이션 실행
+app = create_app(config_key)# 모델/벡터DB 연결은 여기서 한 번만 로드 (pre-fork 시 워커들이 공유)
 
+# 이 시간(초) 안에 종료한 워커는 "시작 직후 실패"로 간주
+WORKER_MIN_UPTIME = 10
+# 시작 직후 실패가 연속 이만큼 반복되면 재시작을 멈추고 서버 종료
+MAX_WORKER_FAILURES = 5
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="waitress 기반 챗봇 서버 실행")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 5000)))
+    parser.add_argument("-w", "--workers", type=int, default=int(os.getenv("WEB_WORKERS", 1)),
+                        help="워커 프로세스 수 (2 이상이면 pre-fork 모드, fork 지원 OS만 해당)")
+    parser.add_argument("-t", "--threads", type=int, default=int(os.getenv("WEB_THREADS", 4)),
+                        help="워커 프로세스당 스레드 수")
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.getenv("GRACEFUL_TIMEOUT", 30)),
+                        help="종료 시 처리 중인 요청을 기다리는 최대 시간(초), 이후 강제 종료")
+    return parser.parse_args(argv)
+
+
+def run_worker(sock, threads, graceful_timeout):
+    """fork된 자식 프로세스에서 공유 소켓으로 요청 처리
+
+    SIGTERM 을 받으면 새 연결 수락을 멈추고, 처리 중인 요청(답변 스트리밍 + ChatLog 저장)이
+    끝나거나 graceful_timeout 이 지나면 종료한다.
+    """
+    server = create_server(app, sockets=[sock], threads=threads, channel_request_lookahead=1)
+    stop_requested = threading.Event()
+
+    def is_busy():
+        return any(channel.requests or channel.total_outbufs_len
+                   for channel in list(server.active_channels.values()))
+
+    def drain():
+        stop_requested.wait()
+        deadline = time.monotonic() + graceful_timeout
+        while is_busy() and time.monotonic() < deadline:
+            time.sleep(0.1)
+        if is_busy():
+            print(f"[worker {os.getpid()}] {graceful_timeout}초 안에 끝나지 않은 요청을 중단하고 종료합니다.",
+                  file=sys.stderr)
+        sys.stderr.flush()
+        os._exit(0)
+
+    def stop(signum, frame):
+        server.accepting = False  # 새 연결은 다른 워커(또는 재시작 후)로
+        stop_requested.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    threading.Thread(target=drain, daemon=True).start()
+    server.run()
+
+
+def run_prefork(host, port, workers, threads, graceful_timeout):
+    """부모 프로세스가 소켓을 열고 워커를 fork한 뒤, 죽은 워커는 백오프를 두고 다시 띄움"""
+    sock = socket.create_server((host, port), backlog=1024)
+
+    # 부모가 열어둔 DB/캐시 커넥션이 자식들과 공유되지 않도록 fork 전에 정리
+    with app.app_context():
+        db.engine.dispose()
+    cache.close()
+
+    children = {}  # pid -> 시작 시각
+    pending_spawns = []  # 재시작 예정 시각
+    failures = 0  # 연속으로 빨리 죽은 워커 수
+    stopping = False
+    kill_deadline = None
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            # 부모의 shutdown 핸들러를 물려받지 않도록 즉시 초기화 (run_worker 가 다시 설치)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            code = 0
+            try:
+                run_worker(sock, threads, graceful_timeout)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stderr.flush()
+                os._exit(code)
+        children[pid] = time.monotonic()
+
+    def shutdown(signum, frame):
+        nonlocal stopping, kill_deadline
+        if stopping:
+            return
+        stopping = True
+        # 워커가 처리 중인 요청을 마칠 시간을 주고, 그래도 남아 있으면 SIGKILL
+        kill_deadline = time.monotonic() + graceful_timeout + 5
+        pending_spawns.clear()
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for _ in range(workers):
+        spawn()
+    print(f"http://{host}:{port} 에서 워커 {workers}개 x 스레드 {threads}개로 실행 중")
+
+    exit_code = 0
+    while children or pending_spawns:
+        now = time.monotonic()
+        if stopping and now >= kill_deadline:
+            for pid in list(children):
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+        for due in [due for due in pending_spawns if due <= now]:
+            pending_spawns.remove(due)
+            spawn()
+
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid = 0
+        if pid == 0:
+            time.sleep(0.2)
+            continue
+
+        started_at = children.pop(pid, now)
+        if stopping:
+            continue
+
+        code = os.waitstatus_to_exitcode(status)
+        print(f"워커 {pid} 가 종료되었습니다 (exit code {code}).", file=sys.stderr)
+        # 시작 직후 종료가 반복되면 배포 오류로 보고 재시작 간격을 늘리다가 중단
+        if now - started_at < WORKER_MIN_UPTIME:
+            failures += 1
+        else:
+            failures = 0
+        if failures >= MAX_WORKER_FAILURES:
+            print(f"워커가 연속 {failures}번 시작 직후 종료되어 서버를 중단합니다.", file=sys.stderr)
+            exit_code = 1
+            shutdown(None, None)
+            continue
+        delay = min(2 ** failures - 1, 30)
+        if delay:
+            print(f"{delay}초 후 워커를 다시 시작합니다.", file=sys.stderr)
+        pending_spawns.append(now + delay)
+
+    sock.close()
+    return exit_code
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.workers > 1 and not hasattr(os, "fork"):
+        print("이 OS는 fork를 지원하지 않아 단일 프로세스로 실행합니다.", file=sys.stderr)
+        args.workers = 1
+
+    if args.workers > 1:
+        sys.exit(run_prefork(args.host, args.port, args.workers, args.threads,
+                             args.graceful_timeout))
+    else:
+        serve(app, host=args.host, port=args.port, threads=args.threads,
+              channel_request_lookahead=1)
+
+
+# waitress 서버로 애플리케이션 실행
 if __name__ == "__main__":
-    serve(app, host="0.0.0.0", port=5000)
\ No newline at end of file
+    main()